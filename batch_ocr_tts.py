@@ -0,0 +1,198 @@
+from loguru import logger
+
+with logger.catch():
+    from typing import Iterable, Iterator, Optional, Dict, List, TextIO
+    from dataclasses import dataclass
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from threading import Lock, BoundedSemaphore
+    from PIL import Image
+    import numpy as np
+    import argparse
+    import hashlib
+    import json
+    import sys
+    import os
+    from result import Result, Ok, Err
+    import reqwest_wrapper
+    from config_utils import load_config
+    from pool_utils import bounded_map
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+
+@dataclass
+class BatchStats:
+    images: int = 0
+    empty: int = 0
+    duplicates: int = 0
+    synthesized: int = 0
+    failed: int = 0  # TTS requests that failed, or whose audio could not be written
+    ocr_failed: int = 0  # unreadable images & OCR errors
+
+
+def iter_image_dir(image_dir: str) -> Iterator[str]:
+    # Sorted so frame dumps are voiced in playback order
+    for name in sorted(os.listdir(image_dir)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            yield os.path.join(image_dir, name)
+
+
+def iter_image_lines(stream: TextIO) -> Iterator[str]:
+    for line in stream:
+        path = line.strip()
+        if path:
+            yield path
+
+
+def init_ocr_worker(use_gpu: bool) -> None:
+    # Imported here so only the pool processes pay for loading the OCR model
+    global paddle_ocr_infer_fn
+    from ocr_server import paddle_ocr_infer_fn, ocr_session
+    ocr_session.use_gpu = use_gpu
+    ocr_session.idle_timeout = 0  # busy until the batch ends, no point in watching for idleness
+
+
+def ocr_image(image_path: str) -> Result[str, str]:
+    # Load inside the worker so only paths cross the process boundary, not whole frames. Errors are returned
+    # instead of raised, so one corrupt image doesn't abort the whole batch
+    try:
+        with Image.open(image_path) as im:
+            img = np.array(im.convert("RGB"))
+        return Ok(paddle_ocr_infer_fn(img))
+    except Exception as e:
+        return Err(str(e))
+
+
+class BatchWriter:
+    """Write synthesized audio & manifest lines, called from both the main & TTS threads"""
+
+    def __init__(self, output_dir: str) -> None:
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = open(os.path.join(output_dir, "manifest.jsonl"), "w", encoding="utf-8")
+        self.lock = Lock()
+
+    def write_audio(self, audio_name: str, audio_data: bytes) -> None:
+        with open(os.path.join(self.output_dir, audio_name), "wb") as f:
+            f.write(audio_data)
+
+    def write_record(self, source: str, text: Optional[str], audio_name: Optional[str], error: Optional[str]) -> None:
+        # One line per source image, images sharing a text point to the same audio file
+        record = {
+            "source": source,
+            "text": text,
+            "audio": audio_name if error is None else None,
+            "error": error,
+        }
+        with self.lock:
+            self.manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.manifest.flush()
+
+    def close(self) -> None:
+        self.manifest.close()
+
+
+def run_batch(
+    image_paths: Iterable[str],
+    output_dir: str,
+    tts_api_url: str,
+    ocr_jobs: int = 1,
+    tts_jobs: int = 4,
+) -> BatchStats:
+    """OCR every image in a process pool, then voice each distinct text once
+    Only a bounded number of images & TTS requests are in flight at any time, so memory stays flat no matter how
+    long the input is. Per distinct text we only keep its digest & audio file name.
+    Every OCR process loads its own model, so a single process runs on the GPU while several run on the CPU.
+    """
+    stats = BatchStats()
+    seen: Dict[bytes, str] = {}  # text digest -> audio file name
+    waiting: Dict[str, List[str]] = {}  # audio file name -> images waiting for its TTS result
+    tts_errors: Dict[str, str] = {}  # audio file name -> why it's missing
+    state_lock = Lock()
+    writer = BatchWriter(output_dir)
+    tts_client = reqwest_wrapper.TTSClient()
+    tts_slots = BoundedSemaphore(tts_jobs * 2)
+
+    def tts_task(audio_name: str, text: str) -> None:
+        error: Optional[str] = None
+        try:
+            writer.write_audio(audio_name, tts_client.get_tts(tts_api_url % text))
+        except Exception as e:
+            error = str(e)
+            logger.warning(f"TTS failed for {audio_name}: {error}")
+        finally:
+            with state_lock:
+                sources = waiting.pop(audio_name)
+                if error is None:
+                    stats.synthesized += 1
+                else:
+                    stats.failed += 1
+                    tts_errors[audio_name] = error
+            tts_slots.release()
+        for source in sources:
+            writer.write_record(source, text, audio_name, error)
+
+    use_gpu = ocr_jobs == 1
+    try:
+        with (
+            ProcessPoolExecutor(ocr_jobs, initializer=init_ocr_worker, initargs=(use_gpu,)) as ocr_pool,
+            ThreadPoolExecutor(tts_jobs) as tts_pool,
+        ):
+            for image_path, res in bounded_map(ocr_pool, ocr_image, image_paths, ocr_jobs * 2):
+                stats.images += 1
+                match res:
+                    case Err(error):
+                        stats.ocr_failed += 1
+                        logger.warning(f"OCR failed for {image_path}: {error}")
+                        writer.write_record(image_path, None, None, error)
+                        continue
+                    case Ok(text):
+                        pass
+                if not text:
+                    stats.empty += 1
+                    writer.write_record(image_path, text, None, None)
+                    continue
+                digest = hashlib.sha1(text.encode("utf-8")).digest()
+                audio_name = seen.get(digest)
+                if audio_name is not None:
+                    with state_lock:
+                        stats.duplicates += 1
+                        if audio_name in waiting:  # written once the first one is voiced
+                            waiting[audio_name].append(image_path)
+                            continue
+                        error = tts_errors.get(audio_name)
+                    writer.write_record(image_path, text, audio_name, error)
+                    continue
+                audio_name = f"{len(seen) + 1:06d}.wav"
+                seen[digest] = audio_name
+                with state_lock:
+                    waiting[audio_name] = [image_path]
+                tts_slots.acquire()  # backpressure: don't outrun the TTS server
+                tts_pool.submit(tts_task, audio_name, text)
+    finally:
+        writer.close()
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless OCR-TTS for a folder of screenshots or frame dumps")
+    parser.add_argument("source", help="directory of images, or - to read image paths from stdin, one per line")
+    parser.add_argument("output_dir", help="where to write the audio files & manifest.jsonl")
+    parser.add_argument("--tts-api-url", help="defaults to the one in config.json")
+    parser.add_argument(
+        "--ocr-jobs", type=int, default=1,
+        help="OCR processes, each loads its own model. 1 runs on the GPU, more run on the CPU to not exhaust VRAM"
+    )
+    parser.add_argument("--tts-jobs", type=int, default=4, help="concurrent TTS requests")
+    args = parser.parse_args()
+
+    tts_api_url = args.tts_api_url or load_config("./config.json").tts_api_url
+    image_paths = iter_image_lines(sys.stdin) if args.source == "-" else iter_image_dir(args.source)
+    stats = run_batch(image_paths, args.output_dir, tts_api_url, args.ocr_jobs, args.tts_jobs)
+    logger.info(f"Batch finished: {stats}")
+
+
+if __name__ == "__main__":
+    with logger.catch():
+        main()
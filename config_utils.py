@@ -1,7 +1,7 @@
 from loguru import logger
 
 with logger.catch():
-    from typing import Dict, Any, Literal, Tuple
+    from typing import Dict, Any, Literal, Tuple, Optional, List
     from dataclasses import dataclass
     import os
     import json
@@ -14,18 +14,23 @@ Json = Dict[str, Any]
 class HotKey:
     key_type: Literal["keyboard", "mouse", "null"]
     key_name: str
+    # e.g. ("ctrl", "shift"), must be exactly the held modifiers for the key to trigger. None matches whatever is
+    # held, which is how bindings saved before chords were supported behave (e.g. "!" recorded as shift+1)
+    modifiers: Optional[Tuple[str, ...]] = ()
 
     def to_json(self) -> Json:
         return {
             "key_type": self.key_type,
-            "key_name": self.key_name
+            "key_name": self.key_name,
+            "modifiers": list(self.modifiers) if self.modifiers is not None else None
         }
 
     @classmethod
     def from_json(cls, json: Json) -> "HotKey":  # I forgot to switch to py3.11 before developing this...
         key_type = json["key_type"]
         key_name = json["key_name"]
-        return HotKey(key_type, key_name)
+        modifiers = tuple(json["modifiers"]) if json.get("modifiers") is not None else None
+        return HotKey(key_type, key_name, modifiers)
 
     @classmethod
     def default(cls) -> "HotKey":
@@ -37,16 +42,26 @@ class Config:
     tts_api_url: str
     capture_window_pos: Tuple[int, int]
     capture_window_size: Tuple[int, int]
-    hot_key: HotKey
+    hot_keys: List[HotKey]  # any of them triggers a capture, the first one is the one edited in the GUI
     max_history_requests: int  # the number of requests to keep in the log window
+    history_dir: str  # where the request log & synthesized audio are persisted
+    max_history_audio: int  # keep the audio of only this many most recent requests, 0 to keep everything
+    phrase_bank_path: Optional[str]  # pack built by phrase_bank.py, looked up before asking the TTS server
+    ocr_idle_unload_seconds: int  # release the OCR model after this long without requests, 0 to keep it loaded
+    hotkey_cooldown_ms: int  # hotkey presses closer than this to the last capture are ignored
 
     def to_json(self) -> Json:
         return {
             "tts_api_url": self.tts_api_url,
             "capture_window_pos": self.capture_window_pos,
             "capture_window_size": self.capture_window_size,
-            "hot_key": self.hot_key.to_json(),
-            "max_history_requests": self.max_history_requests
+            "hot_keys": [hot_key.to_json() for hot_key in self.hot_keys],
+            "max_history_requests": self.max_history_requests,
+            "history_dir": self.history_dir,
+            "max_history_audio": self.max_history_audio,
+            "phrase_bank_path": self.phrase_bank_path,
+            "ocr_idle_unload_seconds": self.ocr_idle_unload_seconds,
+            "hotkey_cooldown_ms": self.hotkey_cooldown_ms
         }
     
     @classmethod
@@ -54,9 +69,20 @@ class Config:
         tts_api_url = json["tts_api_url"]  # or from Default::default()...
         capture_window_pos = json["capture_window_pos"]
         capture_window_size = json["capture_window_size"]
-        hot_key = HotKey.from_json(json["hot_key"])
+        if "hot_keys" in json:
+            hot_keys = [HotKey.from_json(hot_key) for hot_key in json["hot_keys"]]
+        else:  # single binding saved by older versions
+            hot_keys = [HotKey.from_json(json["hot_key"])]
         max_history_requests = json["max_history_requests"]
-        return Config(tts_api_url, capture_window_pos, capture_window_size, hot_key, max_history_requests)
+        history_dir = json.get("history_dir", "./history")  # missing in configs saved by older versions
+        max_history_audio = json.get("max_history_audio", 1000)
+        phrase_bank_path = json.get("phrase_bank_path", None)
+        ocr_idle_unload_seconds = json.get("ocr_idle_unload_seconds", 600)
+        hotkey_cooldown_ms = json.get("hotkey_cooldown_ms", 300)
+        return Config(
+            tts_api_url, capture_window_pos, capture_window_size, hot_keys, max_history_requests, history_dir,
+            max_history_audio, phrase_bank_path, ocr_idle_unload_seconds, hotkey_cooldown_ms
+        )
 
     @classmethod
     def default(cls) -> "Config":
@@ -64,8 +90,13 @@ class Config:
             tts_api_url="http://localhost:47867/tts?format=wav&text=%s",
             capture_window_pos=(200, 200),
             capture_window_size=(600, 200),
-            hot_key=HotKey.default(),
-            max_history_requests=10
+            hot_keys=[HotKey.default()],
+            max_history_requests=1000,  # cheap now that history is virtualized & disk-backed
+            history_dir="./history",
+            max_history_audio=1000,  # a few hundred MiB of wav at most
+            phrase_bank_path=None,
+            ocr_idle_unload_seconds=600,
+            hotkey_cooldown_ms=300
         )
 
 
@@ -0,0 +1,148 @@
+from loguru import logger
+
+with logger.catch():
+    from typing import Optional
+    from dataclasses import dataclass
+    from collections import OrderedDict
+    import sqlite3
+    import os
+
+
+@dataclass
+class HistoryRecord:
+    record_id: int
+    text: str
+    status: str
+    audio_path: Optional[str]  # relative to the audio dir of the store, None if never synthesized
+    error: Optional[str]  # why the last TTS request failed, the recognized text is kept as is
+
+
+class HistoryStore:
+    """Append-only on-disk log of every OCR-TTS request, backed by SQLite
+    Records are keyed by a monotonically increasing rowid, so a view only needs the first & last id to know
+    every row it shows, and can load them lazily one by one. Audio is stored next to the db as plain wav files.
+    Should only be touched from the GUI thread.
+    """
+
+    CACHE_SIZE = 256  # rows kept in memory, roughly a few screens of history
+
+    def __init__(self, history_dir: str, max_audio: int) -> None:
+        self.history_dir = history_dir
+        self.max_audio = max_audio
+        self.audio_dir = os.path.join(history_dir, "audio")
+        os.makedirs(self.audio_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(history_dir, "history.db"))
+        # WAL + NORMAL sync makes each append a sequential write instead of a full fsync'd journal roundtrip
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "text TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "audio_path TEXT, "
+            "error TEXT)"
+        )
+        if "error" not in [row[1] for row in self.conn.execute("PRAGMA table_info(history)")]:
+            self.conn.execute("ALTER TABLE history ADD COLUMN error TEXT")  # logs written by older versions
+        # Lets pruning find the oldest clips without scanning the whole log
+        self.conn.execute("CREATE INDEX IF NOT EXISTS history_audio ON history (id) WHERE audio_path IS NOT NULL")
+        # Requests still in flight when the last session died will never finish
+        self.conn.execute("UPDATE history SET status = 'discarded' WHERE status IN ('ttsing', 'ready')")
+        self.conn.commit()
+
+        self.cache: OrderedDict[int, HistoryRecord] = OrderedDict()
+        # Counted once here, then kept up to date so pruning never has to count or scan the clips
+        self.audio_count: int = self.conn.execute(
+            "SELECT COUNT(*) FROM history WHERE audio_path IS NOT NULL"
+        ).fetchone()[0]
+        self.prune_audio()  # in case max_audio was lowered since the last session
+
+    def first_id(self) -> int:
+        row = self.conn.execute("SELECT MIN(id) FROM history").fetchone()
+        return row[0] if row[0] is not None else 1
+
+    def last_id(self) -> int:
+        row = self.conn.execute("SELECT MAX(id) FROM history").fetchone()
+        return row[0] if row[0] is not None else 0
+
+    def append(self, text: str, status: str) -> int:
+        cur = self.conn.execute("INSERT INTO history (text, status) VALUES (?, ?)", (text, status))
+        self.conn.commit()
+        record_id = cur.lastrowid
+        assert record_id is not None
+        self._cache_put(HistoryRecord(record_id, text, status, None, None))
+        return record_id
+
+    def get(self, record_id: int) -> Optional[HistoryRecord]:
+        record = self.cache.get(record_id)
+        if record is not None:
+            self.cache.move_to_end(record_id)
+            return record
+        row = self.conn.execute(
+            "SELECT id, text, status, audio_path, error FROM history WHERE id = ?", (record_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        record = HistoryRecord(*row)
+        self._cache_put(record)
+        return record
+
+    def update_status(self, record_id: int, status: str, error: Optional[str] = None) -> None:
+        # The error is only kept until the next status change, e.g. a successful retry
+        self.conn.execute("UPDATE history SET status = ?, error = ? WHERE id = ?", (status, error, record_id))
+        self.conn.commit()
+        self.cache.pop(record_id, None)
+
+    def save_audio(self, record_id: int, audio_data: bytes) -> None:
+        audio_path = f"{record_id}.wav"
+        with open(os.path.join(self.audio_dir, audio_path), "wb") as f:
+            f.write(audio_data)
+        cur = self.conn.execute(
+            "UPDATE history SET audio_path = ? WHERE id = ? AND audio_path IS NULL", (audio_path, record_id)
+        )
+        self.audio_count += cur.rowcount  # 0 if the record already had a clip, which was just overwritten
+        self.conn.commit()
+        self.cache.pop(record_id, None)
+        self.prune_audio()
+
+    def prune_audio(self) -> None:
+        # Drop the oldest clips beyond max_audio, their records stay and are re-synthesized on replay.
+        # After each save that's at most one clip, found through the partial index without scanning
+        if self.max_audio <= 0:
+            return
+        while self.audio_count > self.max_audio:
+            row = self.conn.execute(
+                "SELECT id, audio_path FROM history WHERE audio_path IS NOT NULL ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            record_id, audio_path = row
+            try:
+                os.remove(os.path.join(self.audio_dir, audio_path))
+            except FileNotFoundError:
+                pass
+            self.conn.execute("UPDATE history SET audio_path = NULL WHERE id = ?", (record_id,))
+            self.cache.pop(record_id, None)
+            self.audio_count -= 1
+        self.conn.commit()
+
+    def load_audio(self, record_id: int) -> Optional[bytes]:
+        record = self.get(record_id)
+        if record is None or record.audio_path is None:
+            return None
+        full_path = os.path.join(self.audio_dir, record.audio_path)
+        if not os.path.exists(full_path):
+            return None
+        with open(full_path, "rb") as f:
+            return f.read()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _cache_put(self, record: HistoryRecord) -> None:
+        self.cache[record.record_id] = record
+        self.cache.move_to_end(record.record_id)
+        if len(self.cache) > self.CACHE_SIZE:
+            self.cache.popitem(last=False)
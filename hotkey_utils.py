@@ -0,0 +1,149 @@
+from loguru import logger
+
+with logger.catch():
+    from typing import Callable, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+    from pynput import mouse, keyboard
+    import time
+    import win32api
+    import win32con
+    from config_utils import HotKey
+
+
+# pynput reports left & right modifiers separately, chords don't care which one is held
+MODIFIERS = {
+    "ctrl": "ctrl", "ctrl_l": "ctrl", "ctrl_r": "ctrl",
+    "shift": "shift", "shift_l": "shift", "shift_r": "shift",
+    "alt": "alt", "alt_l": "alt", "alt_r": "alt", "alt_gr": "alt",
+    "cmd": "cmd", "cmd_l": "cmd", "cmd_r": "cmd",
+}
+MODIFIER_VKS = {
+    "ctrl": (win32con.VK_CONTROL,),
+    "shift": (win32con.VK_SHIFT,),
+    "alt": (win32con.VK_MENU,),
+    "cmd": (win32con.VK_LWIN, win32con.VK_RWIN),
+}
+
+
+def held_modifier_names() -> Set[str]:
+    # The high bit of GetAsyncKeyState is set while the key is physically down
+    return {
+        modifier for modifier, vks in MODIFIER_VKS.items()
+        if any(win32api.GetAsyncKeyState(vk) & 0x8000 for vk in vks)
+    }
+
+
+def extract_key_name(key: keyboard.Key | keyboard.KeyCode | None) -> Optional[str]:
+    match key:
+        case keyboard.Key():
+            return key.name
+        case keyboard.KeyCode():
+            if key.char and key.char.isprintable():
+                return key.char.lower()
+            # With ctrl held, windows reports a control character (or nothing), fall back to the virtual key
+            if key.vk is not None and (0x30 <= key.vk <= 0x39 or 0x41 <= key.vk <= 0x5A):
+                return chr(key.vk).lower()
+    return None
+
+
+def extract_key_identity(key: keyboard.Key | keyboard.KeyCode | None) -> Optional[str | int]:
+    # What a key is, independently of the modifiers: shift+1 presses "!" but may release "1", both are vk 0x31
+    match key:
+        case keyboard.Key():
+            return key.name
+        case keyboard.KeyCode():
+            return key.vk if key.vk is not None else key.char
+    return None
+
+
+class HotkeyMatcher:
+    """Lookup table from (key type, key name) to the modifier sets bound to it, built once per set of bindings
+    Finding the chords of a key is a single dict lookup, and most keys stop there since they are not bound at all.
+    """
+
+    def __init__(self, bindings: Iterable[HotKey]) -> None:
+        # A None chord stands for a binding that ignores modifiers
+        self.table: Dict[Tuple[str, str], Set[Optional[FrozenSet[str]]]] = {}
+        for binding in bindings:
+            if binding.key_type == "null":
+                continue
+            chord = None if binding.modifiers is None else frozenset(MODIFIERS.get(m, m) for m in binding.modifiers)
+            self.table.setdefault((binding.key_type, binding.key_name.lower()), set()).add(chord)
+
+    def chords(self, key_type: str, key_name: str) -> Optional[Set[Optional[FrozenSet[str]]]]:
+        return self.table.get((key_type, key_name))
+
+
+class HotkeyListener:
+    """Global hotkey listener for any number of key / mouse bindings, optionally with modifiers
+    Runs on pynput's input hook threads, so the callback must only hand work off and return immediately.
+    Auto-repeat of a held key is ignored, and triggers closer than `cooldown` seconds apart are dropped.
+    """
+
+    # Windows waits up to 1s before auto-repeating a held key, a press later than that is a new one even if we
+    # never saw the release (e.g. swallowed by the lock screen)
+    REPEAT_WINDOW = 1.0
+
+    def __init__(self, bindings: Iterable[HotKey], callback: Callable[[], None], cooldown: float) -> None:
+        self.matcher = HotkeyMatcher(bindings)
+        self.callback = callback
+        self.cooldown = cooldown
+        self.last_triggered = float("-inf")
+        self.pressed_keys: Dict[str | int, float] = {}  # key identity -> time of its last press event
+
+        self.keyboard_listener = keyboard.Listener(on_press=self.on_key_press, on_release=self.on_key_release)
+        self.mouse_listener = mouse.Listener(on_click=self.on_mouse_click)
+
+        self.keyboard_listener.start()
+        self.mouse_listener.start()
+
+    def set_bindings(self, bindings: Iterable[HotKey]) -> None:
+        # Swapped in one assignment, the listener threads never see a half-built table
+        self.matcher = HotkeyMatcher(bindings)
+
+    def stop_listeners(self):
+        # should only be called when the main GUI stops
+        self.keyboard_listener.stop()
+        self.mouse_listener.stop()
+
+    def on_key_press(self, key: keyboard.Key | keyboard.KeyCode | None):
+        identity = extract_key_identity(key)
+        if identity is None:
+            return
+        now = time.monotonic()
+        last_pressed = self.pressed_keys.get(identity)
+        self.pressed_keys[identity] = now
+        if last_pressed is not None and now - last_pressed < self.REPEAT_WINDOW:  # auto-repeat
+            return
+        key_name = extract_key_name(key)
+        if key_name is not None:
+            self.trigger("keyboard", key_name)
+
+    def on_key_release(self, key: keyboard.Key | keyboard.KeyCode | None):
+        identity = extract_key_identity(key)
+        if identity is not None:
+            self.pressed_keys.pop(identity, None)
+
+    def on_mouse_click(self, _x, _y, button: mouse.Button, pressed: bool):
+        if pressed:
+            self.trigger("mouse", button.name)
+
+    def trigger(self, key_type: str, key_name: str):
+        chords = self.matcher.chords(key_type, key_name)
+        if chords is None:  # most keys, no need to look any further
+            return
+        if None not in chords and not self.modifiers_match(key_type, key_name, chords):
+            return
+        now = time.monotonic()
+        if now - self.last_triggered < self.cooldown:
+            return
+        self.last_triggered = now
+        self.callback()
+
+    @staticmethod
+    def modifiers_match(key_type: str, key_name: str, chords: Set[Optional[FrozenSet[str]]]) -> bool:
+        # Modifiers are read from the OS rather than tracked from our own events, which miss releases happening
+        # behind the lock screen or secure desktop and would leave e.g. ctrl stuck
+        held_modifiers = held_modifier_names()
+        if key_type == "keyboard":
+            held_modifiers.discard(MODIFIERS.get(key_name, ""))
+        return frozenset(held_modifiers) in chords
@@ -3,7 +3,7 @@ from loguru import logger
 logger.add("gui.log", rotation="1 week", backtrace=True, diagnose=True)    # Once the file is too old, it's rotated
 
 with logger.catch():
-    from PyQt6.QtCore import Qt, QThread, pyqtSignal
+    from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal, QAbstractListModel, QModelIndex
     from PyQt6.QtWidgets import (
         QWidget,
         QVBoxLayout,
@@ -12,8 +12,7 @@ with logger.catch():
         QMainWindow,
         QHBoxLayout,
         QCheckBox,
-        QListWidget,
-        QListWidgetItem,
+        QListView,
         QMenuBar,
         QDialog,
         QLineEdit,
@@ -23,18 +22,21 @@ with logger.catch():
     )
     from PyQt6.QtGui import QPainter, QColor, QMouseEvent
     from screenshot_utils import take_region_screenshot
-    from queue import Queue
+    from queue import Queue, Empty, Full
     import win32gui
     import numpy as np
-    from typing import Optional, Callable, Any, Tuple, Literal
+    from typing import Optional, Callable, Any, Tuple, List, Literal
     from result import Result, Ok, Err
     import sounddevice as sd
     import soundfile as sf
     from io import BytesIO
     from pynput import mouse, keyboard
-    from ocr_server import paddle_ocr_infer_fn
+    from ocr_server import paddle_ocr_infer_fn, ocr_session
     import reqwest_wrapper
     from config_utils import Config, load_config, save_config, HotKey
+    from hotkey_utils import HotkeyListener, MODIFIERS, extract_key_name
+    from history_utils import HistoryStore
+    from phrase_bank import PhraseBank
 
 
 class CaptureWindow(QMainWindow):
@@ -175,12 +177,14 @@ class TaskWorker(QThread):
 
     def run(self) -> None:
         while self.running:
-            if self.task_queue.empty():
-                self.msleep(50)
+            # Block until a task comes in, so it starts right away. The timeout only bounds how long stop() waits
+            try:
+                task = self.task_queue.get(timeout=0.05)
+            except Empty:
+                continue
             else:
                 if self.light_indicator is not None:
                     self.light_indicator.turn_on()
-                task = self.task_queue.get()
                 result = self.task_handler(task)
                 self.task_queue.task_done()
                 if self.light_indicator is not None:
@@ -191,6 +195,97 @@ class TaskWorker(QThread):
         self.running = False
 
 
+STATUS_COLORS = {
+    "ttsing": (QColor(255, 232, 189), QColor("black")),
+    "ready": (QColor(186, 227, 255), QColor("black")),
+    "error": (QColor(255, 163, 181), QColor("black")),
+    "done": (QColor(227, 255, 221), QColor("black")),
+    "discarded": (QColor("grey"), QColor("black")),
+}
+
+
+class HistoryListModel(QAbstractListModel):
+    """Virtualized view over the last `max_rows` records of a HistoryStore
+    Record ids are contiguous, so row `i` is simply record `first_id + i`. Nothing is materialized up front:
+    the view only asks for the rows it actually paints, and those are loaded from the store on demand.
+    """
+
+    def __init__(self, store: HistoryStore, max_rows: int, parent=None) -> None:
+        super().__init__(parent)
+        self.store = store
+        self.max_rows = max_rows
+        self.last_id = store.last_id()
+        self.first_id = max(store.first_id(), self.last_id - max_rows + 1)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return self.last_id - self.first_id + 1
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        record = self.store.get(self.first_id + index.row())
+        if record is None:
+            return None
+        match role:
+            case Qt.ItemDataRole.DisplayRole:
+                return record.text
+            case Qt.ItemDataRole.BackgroundRole:
+                return STATUS_COLORS.get(record.status, (QColor("white"), QColor("black")))[0]
+            case Qt.ItemDataRole.ForegroundRole:
+                return STATUS_COLORS.get(record.status, (QColor("white"), QColor("black")))[1]
+            case Qt.ItemDataRole.ToolTipRole:
+                return record.error
+            case _:
+                return None
+
+    def append(self, text: str, status: str) -> int:
+        row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row)
+        record_id = self.store.append(text, status)
+        self.last_id = record_id
+        self.endInsertRows()
+        if self.rowCount() > self.max_rows:
+            # Only slide the window, the record itself stays on disk
+            self.beginRemoveRows(QModelIndex(), 0, 0)
+            self.first_id += 1
+            self.endRemoveRows()
+        return record_id
+
+    def record_id(self, index: QModelIndex) -> int:
+        return self.first_id + index.row()
+
+    def set_status(self, record_id: int, status: str, error: Optional[str] = None) -> None:
+        self.store.update_status(record_id, status, error)
+        if self.first_id <= record_id <= self.last_id:
+            index = self.index(record_id - self.first_id)
+            self.dataChanged.emit(index, index)
+
+
+def queue_nbytes(queue: Queue) -> int:
+    # Rough payload size of the queued tasks, i.e. screenshots & audio clips, ignoring python object overhead
+    def item_nbytes(item: Any) -> int:
+        match item:
+            case np.ndarray():
+                return item.nbytes
+            case bytes() | str():
+                return len(item)
+            case tuple():
+                return sum(item_nbytes(i) for i in item)
+            case _:
+                return 0
+
+    with queue.mutex:
+        return sum(item_nbytes(item) for item in queue.queue)
+
+
+def format_nbytes(nbytes: Optional[int]) -> str:
+    if nbytes is None:
+        return "?"
+    return f"{nbytes / (1 << 20):.1f} MiB"
+
+
 class TTSHelper:
     """Help TaskWorker to process TTS tasks, while providing a way to change TTS settings during runtime
     Basically a function with it's parameters partially applied & could be modified
@@ -201,9 +296,9 @@ class TTSHelper:
         self.tts_api_url = tts_api_url
 
     def __call__(
-        self, task: Tuple[str, QListWidgetItem]
-    ) -> Tuple[Result[bytes, str], QListWidgetItem]:
-        text, item = task
+        self, task: Tuple[str, int]
+    ) -> Tuple[Result[bytes, str], int]:
+        text, record_id = task
         logger.info("Processing TTS request:", text)
 
         def inner(req_url: str) -> Result[bytes, str]:
@@ -214,7 +309,7 @@ class TTSHelper:
                 return Err(str(e))
 
         res = inner(self.tts_api_url % text)
-        return res, item
+        return res, record_id
 
 
 class TTSAPIInputDialog(QDialog):
@@ -277,6 +372,7 @@ class HotKeyInputDialog(QDialog):
 
         self.rec_kb_listener = None
         self.rec_ms_listener = None
+        self.rec_modifiers: List[str] = []  # modifiers held while recording, in the order they were pressed
 
         self.setWindowTitle("Set Hotkey")
         self.layout = QVBoxLayout(self)
@@ -284,7 +380,7 @@ class HotKeyInputDialog(QDialog):
         self.labelLayout = QHBoxLayout()
         self.labelLayout.addWidget(QLabel("Current hotkey: ", self))
         self.keyTypeLabel = QLabel(self.key.key_type, self)
-        self.keyNameLabel = QLabel(self.key.key_name, self)
+        self.keyNameLabel = QLabel(self.format_key_name(self.key), self)
         self.labelLayout.addWidget(self.keyTypeLabel)
         self.labelLayout.addWidget(self.keyNameLabel)
 
@@ -304,7 +400,8 @@ class HotKeyInputDialog(QDialog):
         self.layout.addWidget(self.buttons)
 
     def record(self):
-        self.rec_kb_listener = keyboard.Listener(on_press=self.on_kb_click)
+        self.rec_modifiers = []
+        self.rec_kb_listener = keyboard.Listener(on_press=self.on_kb_click, on_release=self.on_kb_release)
         self.rec_ms_listener = mouse.Listener(on_click=self.on_ms_click)
         self.rec_kb_listener.start()
         self.rec_ms_listener.start()
@@ -323,20 +420,36 @@ class HotKeyInputDialog(QDialog):
     def update_key(self, key: HotKey):
         self.key = key
         self.keyTypeLabel.setText(key.key_type)
-        self.keyNameLabel.setText(key.key_name)
+        self.keyNameLabel.setText(self.format_key_name(key))
+
+    @staticmethod
+    def format_key_name(key: HotKey) -> str:
+        return "+".join((*(key.modifiers or ()), key.key_name))
 
     def on_kb_click(self, key: keyboard.Key | keyboard.KeyCode | None):
-        match key:
-            case keyboard.Key():
-                self.update_key(HotKey(key_type="keyboard", key_name=key.name))
-            case keyboard.KeyCode():
-                if key.char:
-                    self.update_key(HotKey(key_type="keyboard", key_name=key.char))
+        key_name = extract_key_name(key)
+        if key_name is None:
+            return
+        modifier = MODIFIERS.get(key_name)
+        if modifier is not None:
+            # Wait for the actual key of the chord
+            if modifier not in self.rec_modifiers:
+                self.rec_modifiers.append(modifier)
+            return
+        self.update_key(HotKey(key_type="keyboard", key_name=key_name, modifiers=tuple(self.rec_modifiers)))
         self.stop_rec()
-    
+
+    def on_kb_release(self, key: keyboard.Key | keyboard.KeyCode | None):
+        key_name = extract_key_name(key)
+        if key_name is not None and MODIFIERS.get(key_name) in self.rec_modifiers:
+            # A modifier pressed & released alone is bound by itself
+            modifiers = tuple(m for m in self.rec_modifiers if m != MODIFIERS[key_name])
+            self.update_key(HotKey(key_type="keyboard", key_name=key_name, modifiers=modifiers))
+            self.stop_rec()
+
     def on_ms_click(self, _x, _y, button: mouse.Button, pressed: bool):
         if pressed:
-            self.update_key(HotKey(key_type="mouse", key_name=button.name))
+            self.update_key(HotKey(key_type="mouse", key_name=button.name, modifiers=tuple(self.rec_modifiers)))
             self.stop_rec()
 
     @classmethod
@@ -350,39 +463,6 @@ class HotKeyInputDialog(QDialog):
             return cur_key
 
 
-class SingleKeyHotkeyListener:
-    def __init__(self, input_key: HotKey, callback: Callable[[], None]):
-        self.input_key = input_key
-        self.callback = callback
-
-        self.keyboard_listener = keyboard.Listener(on_press=self.on_key_press)
-        self.mouse_listener = mouse.Listener(on_click=self.on_mouse_click)
-
-        self.keyboard_listener.start()
-        self.mouse_listener.start()
-
-    def stop_listeners(self):
-        # should only be called when the main GUI stops
-        self.keyboard_listener.stop()
-        self.mouse_listener.stop()
-
-    def on_key_press(self, key: keyboard.Key | keyboard.KeyCode | None):
-        extracted_key: Optional[str] = None
-        match key:
-            case keyboard.Key():
-                extracted_key = key.name
-            case keyboard.KeyCode():
-                if key.char:
-                    extracted_key = key.char
-
-        if extracted_key is not None and HotKey(key_type="keyboard", key_name=extracted_key) == self.input_key:
-            self.callback()
-
-    def on_mouse_click(self, _x, _y, button: mouse.Button, pressed: bool):
-        if HotKey(key_type="mouse", key_name=button.name) == self.input_key and pressed:
-            self.callback()
-
-
 class MainWindow(QMainWindow):
     def __init__(
         self,
@@ -404,6 +484,14 @@ class MainWindow(QMainWindow):
         # We use a rust-based TTS client, about 10x faster than python socket.connect
         tts_client = reqwest_wrapper.TTSClient()
 
+        # Known lines are served from the pre-synthesized phrase bank, if there is one
+        self.phrase_bank: Optional[PhraseBank] = None
+        if config.phrase_bank_path is not None:
+            try:
+                self.phrase_bank = PhraseBank(config.phrase_bank_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to open phrase bank, falling back to TTS server only: {e}")
+
         # Create helper function for TTS tasks
         self.tts_helper = TTSHelper(tts_client, config.tts_api_url)
 
@@ -415,15 +503,37 @@ class MainWindow(QMainWindow):
         settingsMenu.addAction("Set Hotkey", self.setHotKeyWithDialog)
         self.setMenuBar(menuBar)
 
-        # Setup hotkeys
-        self.hotkey_listener = SingleKeyHotkeyListener(config.hot_key, self.start_ocr_tts_pipeline)
+        # Setup hotkeys. The listener runs inside the system input hook, so it only queues a capture request and
+        # returns, the screenshot itself is taken by capture_worker. A full queue means a capture is already pending.
+        self.capture_queue = Queue(maxsize=1)
+        self.capture_worker = TaskWorker(self.capture_queue, lambda _: self.start_ocr_tts_pipeline())
+        self.capture_worker.start()
+        self.hotkey_listener = HotkeyListener(
+            config.hot_keys, self.requestCapture, config.hotkey_cooldown_ms / 1000
+        )
 
         # Add two more lights to indicate OCR & TTS worker status for debugging
         self.ocr_light = LightWidget(self, QColor(255, 232, 189), QColor("black"))
         self.tts_light = LightWidget(self, QColor(186, 227, 255), QColor("black"))
 
-        # Create the list widget for displaying the text deque
-        self.textListWidget = QListWidget(self)
+        # Release the OCR model when unused for a while, it is reloaded on the next capture
+        ocr_session.idle_timeout = config.ocr_idle_unload_seconds
+
+        # Show how much memory the OCR model & pending tasks take, refreshed periodically
+        self.memoryLabel = QLabel(self)
+        self.memoryTimer = QTimer(self)
+        self.memoryTimer.timeout.connect(self.updateMemoryLabel)
+        self.memoryTimer.start(2000)
+
+        # Create the list view for displaying the request history. Uniform item sizes let the view skip measuring
+        # rows it doesn't paint, so only the visible part of the history is ever loaded from disk
+        self.history_store = HistoryStore(config.history_dir, config.max_history_audio)
+        self.history_model = HistoryListModel(self.history_store, config.max_history_requests, self)
+        self.textListView = QListView(self)
+        self.textListView.setUniformItemSizes(True)
+        self.textListView.setModel(self.history_model)
+        self.textListView.doubleClicked.connect(self.replayHistoryItem)
+        self.textListView.scrollToBottom()
 
         # Create queues & task workers for the OCR and TTS tasks
         self.ocr_queue = Queue()
@@ -445,10 +555,11 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.toggleCaptureWindowCheckbox)
         layout.addWidget(self.ocr_light)
         layout.addWidget(self.tts_light)
+        layout.addWidget(self.memoryLabel)
 
         vertical_layout = QVBoxLayout()
         vertical_layout.addLayout(layout)
-        vertical_layout.addWidget(self.textListWidget)
+        vertical_layout.addWidget(self.textListView)
 
         # A central widget is needed to set a layout
         centralWidget = QWidget()
@@ -456,6 +567,9 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(centralWidget)
 
     def start_ocr_tts_pipeline(self):
+        # Start reloading the OCR model now if it was released, overlapping with the screenshot
+        ocr_session.warm_up()
+
         hwnd = int(self.capture_window.winId())
 
         # Use win32gui to get the window coordinates
@@ -464,23 +578,43 @@ class MainWindow(QMainWindow):
 
         self.ocr_queue.put(region_screenshot)
 
+    def requestCapture(self):
+        try:
+            self.capture_queue.put_nowait(None)
+        except Full:
+            pass
+
     def toggleCaptureWindow(self, state: int):
         if state == 2:
             self.capture_window.show()
+            ocr_session.warm_up()  # showing the capture area usually means a capture is coming
         else:
             self.capture_window.hide()
 
+    def updateMemoryLabel(self):
+        usage = ocr_session.memory_usage()
+        model_text = "OCR model: "
+        if usage.loaded:
+            model_text += "~" + format_nbytes(usage.rss)  # approximate, see OCRMemoryUsage.rss
+            if usage.gpu is not None:
+                model_text += f" (GPU {format_nbytes(usage.gpu)})"
+        else:
+            model_text += "unloaded"
+        queue_bytes = sum(queue_nbytes(q) for q in (self.ocr_queue, self.tts_queue, self.player_queue))
+        self.memoryLabel.setText(f"{model_text} | Queues: {format_nbytes(queue_bytes)}")
+
     def setTTSAPIWithDialog(self):
         new_url = TTSAPIInputDialog.getNewURL(self, self.tts_helper)
         self.tts_helper.tts_api_url = new_url
         self.config.tts_api_url = new_url
 
     def setHotKeyWithDialog(self):
-        old_key = self.hotkey_listener.input_key
-        self.hotkey_listener.input_key = HotKey("null", "")  # temporary disable
+        # Only the first binding is editable here, extra ones are kept as they are in config.json
+        old_key, *other_keys = self.config.hot_keys or [HotKey("null", "")]
+        self.hotkey_listener.set_bindings([])  # temporary disable
         new_key = HotKeyInputDialog.getNewHotKey(self, old_key)
-        self.hotkey_listener.input_key = new_key
-        self.config.hot_key = new_key
+        self.config.hot_keys = [new_key, *other_keys]
+        self.hotkey_listener.set_bindings(self.config.hot_keys)
 
     @staticmethod
     def process_ocr(img: np.ndarray) -> Result[str, str]:
@@ -492,63 +626,83 @@ class MainWindow(QMainWindow):
         match res:
             case Ok(text):
                 if text:
-                    item = self.addTextItem(text, "ttsing")
-                    self.tts_queue.put((text, item))
+                    # Known lines skip the TTS queue entirely, so they don't wait behind requests in flight
+                    audio_data = self.lookupPhraseBank(text)
+                    if audio_data is not None:
+                        record_id = self.addTextItem(text, "ready")
+                        self.history_store.save_audio(record_id, audio_data)
+                        self.player_queue.put((audio_data, record_id))
+                    else:
+                        record_id = self.addTextItem(text, "ttsing")
+                        self.tts_queue.put((text, record_id))
             case Err(error_data):
                 logger.warning("OCR job failed, error info:", error_data)
 
-    def onTtsFinished(self, res: Tuple[Result[bytes, str], QListWidgetItem]):
+    def lookupPhraseBank(self, text: str) -> Optional[bytes]:
+        if self.phrase_bank is None:
+            return None
+        try:
+            return self.phrase_bank.lookup(text)
+        except Exception as e:
+            # A corrupted pack shouldn't take the GUI down, the TTS server can still voice the line
+            logger.warning(f"Phrase bank lookup failed, falling back to TTS server: {e}")
+            return None
+
+    def onTtsFinished(self, res: Tuple[Result[bytes, str], int]):
         # Update the UI with the TTS result
-        result, item = res
+        result, record_id = res
         match result:
             case Ok(audio_data):
-                self.setTextItemColor(item, "ready")
-                self.player_queue.put((audio_data, item))
+                self.history_store.save_audio(record_id, audio_data)
+                self.history_model.set_status(record_id, "ready")
+                self.player_queue.put((audio_data, record_id))
             case Err(error_data):
-                self.setTextItemColor(item, "error")
-                item.setText(error_data)
+                self.history_model.set_status(record_id, "error", error_data)
+
+    def replayHistoryItem(self, index: QModelIndex):
+        # Replay from the audio cache, only fall back to the TTS server if the audio is gone or never came
+        record_id = self.history_model.record_id(index)
+        record = self.history_store.get(record_id)
+        if record is None or record.status == "ttsing":
+            return
+        audio_data = self.history_store.load_audio(record_id)
+        if audio_data is None:
+            audio_data = self.lookupPhraseBank(record.text)
+            if audio_data is not None:
+                self.history_store.save_audio(record_id, audio_data)
+        if audio_data is not None:
+            self.history_model.set_status(record_id, "ready")
+            self.player_queue.put((audio_data, record_id))
+        else:
+            self.history_model.set_status(record_id, "ttsing")
+            self.tts_queue.put((record.text, record_id))
 
     @staticmethod
-    def play_audio(task: Tuple[bytes, QListWidgetItem]) -> QListWidgetItem:
-        audio_data, item = task
+    def play_audio(task: Tuple[bytes, int]) -> int:
+        audio_data, record_id = task
         data, fs = sf.read(BytesIO(audio_data))
         sd.play(data, fs)
         sd.wait()
-        return item
+        return record_id
 
-    def onPlayerFinished(self, item: QListWidgetItem):
-        self.setTextItemColor(item, "done")
+    def onPlayerFinished(self, record_id: int):
+        self.history_model.set_status(record_id, "done")
 
     def closeEvent(self, _event) -> None:
         self.capture_window.close()
         self.hotkey_listener.stop_listeners()
-
-    def addTextItem(self, text: str, status: str) -> QListWidgetItem:
-        # Create a new list item with the provided text
-        item = QListWidgetItem(text)
-        self.setTextItemColor(item, status)
-        self.textListWidget.addItem(item)
-        scroll_bar = self.textListWidget.verticalScrollBar()
-        if scroll_bar is not None and scroll_bar.value() == scroll_bar.maximum():
-            self.textListWidget.scrollToBottom()
-        if self.textListWidget.count() > self.config.max_history_requests:
-            self.textListWidget.takeItem(0)
-        return item
-
-    def setTextItemColor(self, item: QListWidgetItem, status: str):
-        # Change the color of the list item based on its status
-        color_dict = {
-            "ttsing": (QColor(255, 232, 189), QColor("black")),
-            "ready": (QColor(186, 227, 255), QColor("black")),
-            "error": (QColor(255, 163, 181), QColor("black")),
-            "done": (QColor(227, 255, 221), QColor("black")),
-            "discarded": (QColor("grey"), QColor("black")),
-        }
-        background_color, text_color = color_dict.get(
-            status, (QColor("white"), QColor("black"))
-        )
-        item.setBackground(background_color)
-        item.setForeground(text_color)
+        self.history_store.close()
+        if self.phrase_bank is not None:
+            self.phrase_bank.close()  # only ever used from the GUI thread, no lookup can be in flight
+
+    def addTextItem(self, text: str, status: str) -> int:
+        # Append the text to the history, following the tail only if the user hasn't scrolled away
+        scroll_bar = self.textListView.verticalScrollBar()
+        at_bottom = scroll_bar is None or scroll_bar.value() == scroll_bar.maximum()
+        record_id = self.history_model.append(text, status)
+        if at_bottom:
+            self.textListView.scrollToBottom()
+        return record_id
 
 
 if __name__ == "__main__":
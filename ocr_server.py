@@ -10,13 +10,124 @@ app = Flask(__name__)
 
 
 from paddleocr import PaddleOCR
+import paddle
+import threading
+import time
+import gc
+from dataclasses import dataclass
+from typing import Optional
 
-ocr_session = PaddleOCR(lang="ch", det=False, use_gpu=True)
+try:
+    import psutil  # only used to report the footprint of the model
+except ImportError:
+    psutil = None
+
+
+def process_rss() -> Optional[int]:
+    return psutil.Process().memory_info().rss if psutil is not None else None
+
+
+def gpu_allocated() -> Optional[int]:
+    # Polled by the GUI, so a broken CUDA setup must not raise out of here
+    try:
+        return paddle.device.cuda.memory_allocated()
+    except Exception:
+        return None
+
+
+@dataclass
+class OCRMemoryUsage:
+    loaded: bool
+    # Approximate: growth of the whole process RSS while the model was loading, which also counts whatever other
+    # threads allocated meanwhile. None if unknown
+    rss: Optional[int]
+    gpu: Optional[int]  # GPU memory allocated by paddle, None if the model isn't loaded on the GPU
+
+
+class IdleOCRSession:
+    """PaddleOCR session that only stays resident while it is being used
+    The model is loaded on first use (or ahead of time through warm_up), and released once nobody asked for OCR
+    during `idle_timeout` seconds. An idle_timeout of 0 keeps it loaded forever.
+    """
+
+    def __init__(self, idle_timeout: float, use_gpu: bool = True) -> None:
+        self.idle_timeout = idle_timeout
+        self.use_gpu = use_gpu  # only takes effect on the next load
+        self.cond = threading.Condition()  # guards the session, and wakes the idle watcher up on load
+        self.session: Optional[PaddleOCR] = None
+        self.session_on_gpu = False
+        self.last_used = time.monotonic()
+        self.idle_watcher: Optional[threading.Thread] = None
+        self.model_rss: Optional[int] = None
+
+    def ocr(self, img: np.ndarray):
+        with self.cond:
+            result = self._load_locked().ocr(img, cls=False)
+            self.last_used = time.monotonic()
+            return result
+
+    def warm_up(self) -> None:
+        # Load in the background so it overlaps with whatever the caller does before the actual OCR request
+        if self.session is None:
+            threading.Thread(target=self.load, daemon=True).start()
+
+    def load(self) -> None:
+        with self.cond:
+            self._load_locked()
+            self.last_used = time.monotonic()
+
+    def memory_usage(self) -> OCRMemoryUsage:
+        # Lock-free on purpose: the GUI polls this and shouldn't wait behind an OCR request, nor touch CUDA while
+        # the model is released
+        loaded = self.session is not None
+        gpu = gpu_allocated() if loaded and self.session_on_gpu else None
+        return OCRMemoryUsage(loaded, self.model_rss, gpu)
+
+    def _load_locked(self) -> PaddleOCR:
+        if self.session is None:
+            logger.info("Loading OCR model...")
+            rss_before = process_rss()
+            self.session = PaddleOCR(lang="ch", det=False, use_gpu=self.use_gpu)
+            self.session_on_gpu = self.use_gpu
+            rss_after = process_rss()
+            if rss_before is not None and rss_after is not None:
+                # Other threads may free memory during the load too, never report a negative footprint
+                self.model_rss = max(rss_after - rss_before, 0)
+            if self.idle_timeout > 0 and self.idle_watcher is None:
+                self.idle_watcher = threading.Thread(target=self._watch_idle, daemon=True)
+                self.idle_watcher.start()
+            self.cond.notify()
+        return self.session
+
+    def _unload_locked(self) -> None:
+        logger.info("OCR model idle, unloading...")
+        self.session = None
+        self.model_rss = None
+        gc.collect()
+        if self.session_on_gpu:
+            paddle.device.cuda.empty_cache()
+
+    def _watch_idle(self) -> None:
+        # A single thread for the whole session lifetime: it sleeps until the model would have been idle for
+        # idle_timeout, and re-checks last_used when it wakes up, rather than rescheduling a timer on every request
+        with self.cond:
+            while True:
+                if self.session is None or self.idle_timeout <= 0:
+                    self.cond.wait()  # until the next load
+                    continue
+                remaining = self.last_used + self.idle_timeout - time.monotonic()
+                if remaining > 0:
+                    self.cond.wait(remaining)
+                else:
+                    self._unload_locked()
+
+
+ocr_session = IdleOCRSession(idle_timeout=600)
 
 
 def paddle_ocr_infer_fn(img: np.ndarray) -> str:
     logger.info("start ocr")
-    result = ocr_session.ocr(img, cls=False)
+    result = ocr_session.ocr(img)
     logger.info("end ocr")
     try:
         return "".join([line[-1][0] for line in result[0]])
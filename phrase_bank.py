@@ -0,0 +1,179 @@
+from loguru import logger
+
+with logger.catch():
+    from typing import Iterable, Iterator, List, Optional, Tuple
+    from concurrent.futures import ThreadPoolExecutor
+    import unicodedata
+    import argparse
+    import hashlib
+    import struct
+    import mmap
+    import os
+    from pool_utils import bounded_map
+
+
+# Pack layout, all little endian:
+#   header: magic, version, entry count, offset of the exact index, offset of the normalized index
+#   data:   per entry u32 text length, u32 audio length, utf-8 text, wav bytes
+#   index:  two tables of (u64 key hash, u64 entry offset), each sorted by hash
+MAGIC = b"SAPB"
+VERSION = 1
+HEADER = struct.Struct("<4sIIQQ")
+ENTRY_HEADER = struct.Struct("<II")
+INDEX_ENTRY = struct.Struct("<QQ")
+
+
+def normalize_text(text: str) -> str:
+    # OCR tends to disagree with the script on width, case, spaces & punctuation, but rarely on the words
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return "".join(c for c in text if unicodedata.category(c)[0] not in "PZC")
+
+
+def hash_key(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class PhraseBank:
+    """Read-only, memory-mapped lookup of pre-synthesized clips
+    Only the pages actually touched by a lookup are paged in, so a bank of any size costs next to nothing to keep open.
+    """
+
+    def __init__(self, pack_path: str) -> None:
+        self.file = open(pack_path, "rb")
+        try:
+            # Check everything the lookups rely on up front, a bad pack is reported as ValueError rather than
+            # struct.error or an out of range read later on
+            size = os.fstat(self.file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{pack_path} is too short to be a phrase bank pack")
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.file.close()
+            raise
+        magic, version, self.count, self.exact_offset, self.normalized_offset = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{pack_path} is not a phrase bank pack (version {VERSION})")
+        table_size = self.count * INDEX_ENTRY.size
+        for table_offset in (self.exact_offset, self.normalized_offset):
+            if table_offset < HEADER.size or table_offset + table_size > size:
+                self.close()
+                raise ValueError(f"{pack_path} is truncated or corrupted")
+
+    def lookup(self, text: str) -> Optional[bytes]:
+        audio_data = self._lookup(self.exact_offset, text, lambda t: t)
+        if audio_data is None:
+            audio_data = self._lookup(self.normalized_offset, normalize_text(text), normalize_text)
+        return audio_data
+
+    def close(self) -> None:
+        self.mm.close()
+        self.file.close()
+
+    def _lookup(self, table_offset: int, key: str, to_key) -> Optional[bytes]:
+        if not key:
+            return None
+        target = hash_key(key)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if INDEX_ENTRY.unpack_from(self.mm, table_offset + mid * INDEX_ENTRY.size)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        # Walk every entry sharing the hash, in case of collisions
+        while lo < self.count:
+            key_hash, entry_offset = INDEX_ENTRY.unpack_from(self.mm, table_offset + lo * INDEX_ENTRY.size)
+            if key_hash != target:
+                break
+            lo += 1
+            # Entries are only checked when read, __init__ can't afford walking them all on a large pack
+            if entry_offset + ENTRY_HEADER.size > len(self.mm):
+                continue
+            text_len, audio_len = ENTRY_HEADER.unpack_from(self.mm, entry_offset)
+            text_start = entry_offset + ENTRY_HEADER.size
+            if text_start + text_len + audio_len > len(self.mm):
+                continue
+            try:
+                entry_text = self.mm[text_start:text_start + text_len].decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            if to_key(entry_text) == key:
+                return self.mm[text_start + text_len:text_start + text_len + audio_len]
+        return None
+
+
+def build_phrase_bank(
+    texts: Iterable[str],
+    pack_path: str,
+    tts_api_url: str,
+    jobs: int = 4,
+) -> Tuple[int, int]:
+    """Synthesize every distinct text through the TTS API and write them into a single pack file
+    Returns the number of packed and failed texts.
+    """
+    import reqwest_wrapper  # only the build step talks to the TTS server
+
+    tts_client = reqwest_wrapper.TTSClient()
+
+    def synthesize(text: str) -> Tuple[str, Optional[bytes]]:
+        try:
+            return text, tts_client.get_tts(tts_api_url % text)
+        except Exception as e:
+            logger.warning(f"TTS failed for {text}: {e}")
+            return text, None
+
+    exact_index: List[Tuple[int, int]] = []
+    normalized_index: List[Tuple[int, int]] = []
+    failed = 0
+    tmp_path = pack_path + ".tmp"
+    with open(tmp_path, "wb") as f, ThreadPoolExecutor(jobs) as pool:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))  # patched once the index is written
+        # Entries are written as they come, only `jobs * 2` clips are ever held in memory
+        for _, (text, audio_data) in bounded_map(pool, synthesize, dict.fromkeys(texts), jobs * 2):
+            if audio_data is None:
+                failed += 1
+                continue
+            entry_offset = f.tell()
+            text_data = text.encode("utf-8")
+            f.write(ENTRY_HEADER.pack(len(text_data), len(audio_data)))
+            f.write(text_data)
+            f.write(audio_data)
+            exact_index.append((hash_key(text), entry_offset))
+            normalized_index.append((hash_key(normalize_text(text)), entry_offset))
+
+        exact_offset = f.tell()
+        for key_hash, entry_offset in sorted(exact_index):
+            f.write(INDEX_ENTRY.pack(key_hash, entry_offset))
+        normalized_offset = f.tell()
+        for key_hash, entry_offset in sorted(normalized_index):
+            f.write(INDEX_ENTRY.pack(key_hash, entry_offset))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(exact_index), exact_offset, normalized_offset))
+    os.replace(tmp_path, pack_path)
+    return len(exact_index), failed
+
+
+def iter_text_lines(text_path: str) -> Iterator[str]:
+    with open(text_path, "r", encoding="utf-8") as f:
+        for line in f:
+            text = line.strip()
+            if text:
+                yield text
+
+
+if __name__ == "__main__":
+    with logger.catch():
+        from config_utils import load_config
+
+        parser = argparse.ArgumentParser(description="Pre-synthesize known lines into a phrase bank pack")
+        parser.add_argument("text_file", help="utf-8 text file, one line per phrase")
+        parser.add_argument("pack_path", help="where to write the pack, point phrase_bank_path in config.json to it")
+        parser.add_argument("--tts-api-url", help="defaults to the one in config.json")
+        parser.add_argument("--jobs", type=int, default=4, help="concurrent TTS requests")
+        args = parser.parse_args()
+
+        tts_api_url = args.tts_api_url or load_config("./config.json").tts_api_url
+        packed, failed = build_phrase_bank(iter_text_lines(args.text_file), args.pack_path, tts_api_url, args.jobs)
+        logger.info(f"Packed {packed} phrases into {args.pack_path}, {failed} failed")
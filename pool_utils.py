@@ -0,0 +1,22 @@
+from typing import Callable, Iterable, Iterator, Tuple, TypeVar
+from concurrent.futures import Executor, Future
+from collections import deque
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def bounded_map(executor: Executor, fn: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[Tuple[T, R]]:
+    """Like executor.map, but never has more than `window` items in flight
+    executor.map submits the whole iterable up front, which means reading all of stdin before the first result.
+    """
+    pending: deque[Tuple[T, Future]] = deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            head, future = pending.popleft()
+            yield head, future.result()
+    while pending:
+        head, future = pending.popleft()
+        yield head, future.result()
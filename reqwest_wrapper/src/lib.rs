@@ -45,20 +45,18 @@ impl TTSClient {
         }
     }
 
-    pub fn get_tts(&self, url: &str) -> PyResult<Py<PyAny>> {
-        fn get_tts_helper(client: &reqwest::blocking::Client, url: &str) -> Result<Py<PyAny>, TTSError> {
+    pub fn get_tts(&self, py: Python, url: &str) -> PyResult<Py<PyAny>> {
+        fn get_tts_helper(client: &reqwest::blocking::Client, url: &str) -> Result<Vec<u8>, TTSError> {
             let res = client.get(url).send()?;
             if res.status().is_success() && res.headers().get(CONTENT_TYPE) == Some(&"audio/wav".parse().unwrap()) {
-                let audio_data = res.bytes()?;
-                let audio_data = std::borrow::Cow::Owned(audio_data.to_vec());
-                Python::with_gil(|py| {
-                    Ok(PyBytes::new(py, &audio_data).to_object(py))
-                })
+                Ok(res.bytes()?.to_vec())
             } else {
                 Err(TTSError::ServerErr(res.text()?))
             }
         }
-        get_tts_helper(&self.client, url).map_err(From::from)
+        // Release the GIL while waiting on the server, so python threads sharing one client actually run concurrently
+        let audio_data = py.allow_threads(|| get_tts_helper(&self.client, url))?;
+        Ok(PyBytes::new(py, &audio_data).to_object(py))
     }
 }
 